@@ -5,6 +5,7 @@ import numpy as np
 from tqdm import tqdm
 from sentence_transformers import SentenceTransformer
 from src.chunking import chunk_text_within_token_limit
+from src.utils import count_remote_call
 import google.generativeai as genai
 from src.config import gemini_key, token_limits, default_embedding_model, logger
 genai.configure(api_key=gemini_key)
@@ -30,6 +31,7 @@ def get_embeddings(texts, params={}, model=None):
         logger.info(f'Embedding model - {model}')
         task_type = params.get('task_type', 'retrieval_document')
         title = params.get('title', 'Web scraped raw data of a company')
+        count_remote_call('embeddings')
         if task_type == 'retrieval_document':
             embeddings = genai.embed_content(model=f'models/{model}', content = texts, task_type=task_type, title = title)
         else:
@@ -1,9 +1,9 @@
 import os
 from src.llm import chat
-from src.utils import write_json
+from src.utils import write_json, reset_remote_calls, get_remote_calls
 from src.config import logs_folder, logger
 from src.index.utils import get_index_name
-from src.index.search import search_on_index
+from src.index.search import search_on_index, create_query_plan
 from src.prompts import index_questioning, index_questioning_system_prompt, index_questioning_two_companies
 
 def start_convo_on_index(index, search_params, conversation_file = 'conversation.json'):
@@ -31,6 +31,7 @@ def start_convo_on_index(index, search_params, conversation_file = 'conversation
         if query == 'exit':
             break
         logger.print('-----------------------------------------------')
+        reset_remote_calls()
         search_params['history'] = history if query_enhance_with_history else None
         search_res = search_on_index(query, index, search_params)
         sim_text = search_res['result_text'].replace('*', '')
@@ -45,7 +46,9 @@ def start_convo_on_index(index, search_params, conversation_file = 'conversation
 
         logger.print('Assistant:', pres.replace('*', ''))
         logger.print('-----------------------------------------------')
-        history.append({'role': 'assistant', 'content': pres})
+        remote_calls = get_remote_calls()
+        logger.info(f'Remote calls in this turn: {remote_calls}')
+        history.append({'role': 'assistant', 'content': pres, 'remote_calls': remote_calls})
         history_log = {i:history[i] for i in range(len(history))}
         write_json(history_log, convo_path)
     return
@@ -76,17 +79,19 @@ def start_convo_on_two_indexes(index_1, index_2, search_params, conversation_fil
         if query == 'exit':
             break
         logger.print('-----------------------------------------------')
+        reset_remote_calls()
         search_params['history'] = history if query_enhance_with_history else None
+        query_plan = create_query_plan(query, history=search_params['history'], search_query=search_params.get('search_query', 'hybrid')) # shared by both indexes
         k = search_params['k']
         search_params['k'] = k//2
         index_1_name = get_index_name(index_1)
         index_2_name = get_index_name(index_2)
 
-        search_res_1 = search_on_index(query, index_1, search_params)
+        search_res_1 = search_on_index(query, index_1, search_params, query_plan=query_plan)
         sim_text_1 = search_res_1['result_text'].replace('*', '')
         enhanced_query = search_res_1['enhanced_query']
 
-        search_res_2 = search_on_index(query, index_2, search_params)
+        search_res_2 = search_on_index(query, index_2, search_params, query_plan=query_plan)
         sim_text_2 = search_res_2['result_text'].replace('*', '')
         search_params['k'] = k # reset k
 
@@ -105,7 +110,9 @@ def start_convo_on_two_indexes(index_1, index_2, search_params, conversation_fil
 
         logger.print('Assistant:', pres.replace('*', ''))
         logger.print('-----------------------------------------------')
-        history.append({'role': 'assistant', 'content': pres})
+        remote_calls = get_remote_calls()
+        logger.info(f'Remote calls in this turn: {remote_calls}')
+        history.append({'role': 'assistant', 'content': pres, 'remote_calls': remote_calls})
         history_log = {i:history[i] for i in range(len(history))}
         write_json(history_log, convo_path)
     return
\ No newline at end of file
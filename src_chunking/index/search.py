@@ -2,6 +2,7 @@ import math
 import numpy as np
 from src.llm import chat
 from src.embeddings import get_embeddings
+from src.index.utils import build_emb_matrix, get_emb_matrix
 from src.prompts import query_enhancement_prompt, query_enhancement_with_history
 from src.config import logger, query_enhancement_history_model, query_enhancement_model, twolevel_t1, twolevel_t2, twolevel_l2_reserve, twolevel_l1_reserve
 
@@ -27,7 +28,59 @@ def query_enhancement(query, history=None, history_len=10):
         raw_res, json_res = chat(query_enhancement_model, prompt, response_format='json')
     return json_res['query']
 
-def search_on_dict_index(query, index, embedding_model, history=None, k=20, search_query='hybrid'):
+def create_query_plan(query, history=None, search_query='hybrid'):
+    """
+    Given a query, the function resolves the query texts used for semantic search once per user turn.
+    The same plan is reused for both levels of an index and across indexes, so the query is enhanced at most once and each query text is embedded at most once per embedding model.
+    Args:
+        query: str: The query to search for
+        history: list of dicts: The history of the conversation. Each dict has keys: 'role', 'content'
+        search_query: str: The type of query to search with: 'hybrid', 'enhanced', 'raw'
+    Returns:
+        query_plan: dict:
+            keys:
+                query: str: The raw query
+                search_query: str: The resolved type of query
+                query_texts: dict: The texts to embed. Keys are 'raw' and/or 'enhanced'
+                enhanced_query: str: The enhanced query (None if search_query is 'raw')
+                query_embs: dict: The query embeddings per embedding model. Filled lazily by get_query_embeddings
+    """
+    if search_query not in ['hybrid', 'enhanced', 'raw']:
+        print('WARNING: Invalid search_query parameter. Using both enhanced and raw query for semantic search...')
+        search_query = 'hybrid'
+    enhanced_query = query_enhancement(query, history) if search_query in ['hybrid', 'enhanced'] else None
+    query_texts = {}
+    if search_query in ['hybrid', 'raw']:
+        query_texts['raw'] = query
+    if search_query in ['hybrid', 'enhanced']:
+        query_texts['enhanced'] = enhanced_query
+    query_plan = {'query': query, 'search_query': search_query, 'query_texts': query_texts, 'enhanced_query': enhanced_query, 'query_embs': {}}
+    return query_plan
+
+def get_query_embeddings(query_plan, embedding_model):
+    """
+    Returns the float32 embeddings of all the query texts of a query plan, shape: (v*d); v - number of query texts.
+    All the query texts are embedded in one get_embeddings call and the result is cached on the plan per embedding model.
+    """
+    if embedding_model not in query_plan['query_embs']:
+        logger.info('Getting embeddings for the query...')
+        params = {'task_type': 'retrieval_query'} # will be used only if embedding_model is 'text-embedding-004'
+        texts = list(query_plan['query_texts'].values())
+        query_embs = get_embeddings(texts, params=params, model=embedding_model)
+        query_plan['query_embs'][embedding_model] = np.asarray(query_embs, dtype=np.float32).reshape(len(texts), -1)
+    return query_plan['query_embs'][embedding_model]
+
+def get_similarity_scores(query_plan, emb_matrix, embedding_model):
+    """
+    Computes the similarity scores of all the rows of emb_matrix with the query plan.
+    When the plan has both raw and enhanced queries, the score of each row is the maximum of the two.
+    """
+    query_embs = get_query_embeddings(query_plan, embedding_model)
+    similarity_scores = emb_matrix @ query_embs.T # shape: (n*v)
+    similarity_scores = similarity_scores.max(axis=1) # shape: (n)
+    return similarity_scores
+
+def search_on_dict_index(query, index, embedding_model, history=None, k=20, search_query='hybrid', emb_matrix=None, row_ids=None, query_plan=None):
     """
     Given a query and an index, the function searches for the query in the index.
     Args:
@@ -37,62 +90,36 @@ def search_on_dict_index(query, index, embedding_model, history=None, k=20, sear
         history: list of dicts: The history of the conversation. Each dict has keys: 'role', 'content'
         k: int: The number of results to return
         search_query: str: The type of query to search with: 'hybrid', 'enhanced', 'raw'
+        emb_matrix: np.array: float32 embedding matrix of the index (see build_emb_matrix). Built from the index if None
+        row_ids: np.array: Chunk id of each row of emb_matrix
+        query_plan: dict: The query plan to reuse (see create_query_plan). Created from query, history and search_query if None
     """
-    def get_similarity_scores(query, index):
-        params = {'task_type': 'retrieval_query'} # will be used only if embedding_model is 'text-embedding-004'
-        query_emb = get_embeddings([query], params=params, model=embedding_model)[0]
-        index_embs = [index[key]['emb'] for key in range(len(index))]
-        emb_matrix = np.array(index_embs) # shpe: (n*d); n - number of paragraphs, d - dimension of embeddings
-        similarity_scores = emb_matrix @ query_emb # shape: (n)
-        similarity_scores = similarity_scores.flatten()
-        return similarity_scores
-    
-    def aggregate_similarity_scores(scores_1, scores_2):
-        aggregates_scores = np.maximum(scores_1, scores_2)
-        return aggregates_scores
-
-    if search_query == 'hybrid':
-        enhanced_query = query_enhancement(query, history)
-        raw_query = query
-    elif search_query == 'enhanced':
-        enhanced_query = query_enhancement(query, history)
-        raw_query = None
-    elif search_query == 'raw':
-        enhanced_query = None
-        raw_query = query
-    else:
-        print('WARNING: Invalid search_query parameter. Using both enhanced and raw query for semantic search...')
-        search_query = 'hybrid'
-        enhanced_query = query_enhancement(query, history)
-        raw_query = query
+    if emb_matrix is None:
+        emb_matrix, row_ids = build_emb_matrix(index)
+    if query_plan is None:
+        query_plan = create_query_plan(query, history=history, search_query=search_query)
 
-    logger.info('Getting embeddings for the query...')
-    if search_query == 'raw':
-        similarity_scores = get_similarity_scores(raw_query, index)
-    elif search_query == 'enhanced':
-        similarity_scores = get_similarity_scores(enhanced_query, index)
-    else:
-        similarity_scores_raw = get_similarity_scores(raw_query, index)
-        similarity_scores_enhanced = get_similarity_scores(enhanced_query, index)
-        similarity_scores = aggregate_similarity_scores(similarity_scores_raw, similarity_scores_enhanced)
-        
-    top_k_inds = np.argsort(similarity_scores)[-k:][::-1]
+    similarity_scores = get_similarity_scores(query_plan, emb_matrix, embedding_model)
+    top_k_rows = np.argsort(similarity_scores)[-k:][::-1]
+    top_k_inds = row_ids[top_k_rows]
     ret_text = '\n'.join([index[i]['text'] for i in top_k_inds])
     search_res = {}
     search_res['result_text'] = ret_text
     search_res['top_k_indices'] = top_k_inds.tolist()
-    search_res['top_k_similarity_scores'] = similarity_scores[top_k_inds].tolist()
+    search_res['top_k_similarity_scores'] = similarity_scores[top_k_rows].tolist()
     search_res['top_k_chunks'] = [index[i]['text'] for i in top_k_inds]
-    search_res['enhanced_query'] = enhanced_query
+    search_res['enhanced_query'] = query_plan['enhanced_query']
     search_res['top_k_websites'] = [index[i]['info']['website'] for i in top_k_inds] if 'website' in index[0]['info'] else None
     return search_res
 
-def search_on_twolevel_index(query, index, params, history=None, k=20, search_query='hybrid'):
+def search_on_twolevel_index(query, index, params, history=None, k=20, search_query='hybrid', query_plan=None):
     def get_search_res():
         l1_index = index['l1_index']
         l2_index = index['l2_index']
-        l1_search_res = search_on_dict_index(query, l1_index, params['embedding_model'], history=history, k=len(l1_index), search_query=search_query)
-        l2_search_res = search_on_dict_index(query, l2_index, params['embedding_model'], history=history, k=len(l2_index), search_query=search_query)
+        l1_emb_matrix, l1_row_ids = get_emb_matrix(index, 'l1')
+        l2_emb_matrix, l2_row_ids = get_emb_matrix(index, 'l2')
+        l1_search_res = search_on_dict_index(query, l1_index, params['embedding_model'], k=len(l1_index), emb_matrix=l1_emb_matrix, row_ids=l1_row_ids, query_plan=query_plan)
+        l2_search_res = search_on_dict_index(query, l2_index, params['embedding_model'], k=len(l2_index), emb_matrix=l2_emb_matrix, row_ids=l2_row_ids, query_plan=query_plan)
         return l1_search_res, l2_search_res
     
     def add_similarity_scores(l1_index, l2_index, l1_search_res, l2_search_res):
@@ -188,6 +215,8 @@ def search_on_twolevel_index(query, index, params, history=None, k=20, search_qu
         search_res['top_k_info'] = top_k_info
         return search_res
 
+    if query_plan is None:
+        query_plan = create_query_plan(query, history=history, search_query=search_query)
     l1_search_res, l2_search_res = get_search_res()
     l1_index, l2_index = add_similarity_scores(index['l1_index'], index['l2_index'], l1_search_res, l2_search_res)
     l1_reserve_idx, l2_reserve_idx = get_reserve_idx(l1_index, l2_index, params, l1_search_res, l2_search_res)
@@ -197,7 +226,7 @@ def search_on_twolevel_index(query, index, params, history=None, k=20, search_qu
     final_search_res['enhanced_query'] = l1_search_res['enhanced_query']
     return final_search_res
 
-def search_on_index(query, index, search_params, verbose=True):
+def search_on_index(query, index, search_params, verbose=True, query_plan=None):
     """
     The function performs search with a given query on a given index.
     Args:
@@ -211,8 +240,8 @@ def search_on_index(query, index, search_params, verbose=True):
             t2: float: The threshold for similarity score at level 2
             l1_reserve: int: The percentage of k to reserve for level 1
             l2_reserve: int: The percentage of k to reserve for level 2
-        output_path: str: The path to save the search output
         verbose: bool: Whether to print the search results
+        query_plan: dict: A query plan (see create_query_plan) shared with other searches of the same user turn. If None, the plan is created from query and search_params
     Returns:
         search_res: dict: The search results
             keys:
@@ -227,7 +256,7 @@ def search_on_index(query, index, search_params, verbose=True):
     k = search_params.get('k', 20)
     logger.info('Searching on two-level index...')
     search_params['embedding_model'] = index['embedding_model']
-    search_res = search_on_twolevel_index(query, index, search_params, history=history, search_query=search_query, k=k)
+    search_res = search_on_twolevel_index(query, index, search_params, history=history, search_query=search_query, k=k, query_plan=query_plan)
     
     if verbose:
         logger.info('----------------------------------------------------')
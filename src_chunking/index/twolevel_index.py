@@ -2,6 +2,31 @@ from tqdm import tqdm
 from src.config import all_mpnet_base_v2, text_embedding_004, default_embedding_model
 from src.chunking import chunk_scrape_res_to_paras, chunk_corpus_to_paras
 from src.embeddings import get_scrape_res_paras_embeddings, get_multipara_embedding
+from src.index.utils import build_emb_matrix
+
+def add_emb_matrices(index):
+    """
+    Adds one contiguous float32 embedding matrix per level to the index along with the row to chunk id arrays.
+    The matrices are pickled with the index so that search doesn't have to rebuild them from the chunk dicts on every query.
+    The matrix is then the only copy of the embeddings: 'emb' is removed from the chunk dicts (see drop_chunk_embeddings).
+    """
+    for level in ['l1', 'l2']:
+        emb_matrix, row_ids = build_emb_matrix(index[f'{level}_index'])
+        index[f'{level}_emb_matrix'] = emb_matrix
+        index[f'{level}_row_ids'] = row_ids
+    index = drop_chunk_embeddings(index)
+    return index
+
+def drop_chunk_embeddings(index):
+    """
+    Removes 'emb' from the chunk dicts of the levels that have an embedding matrix, so every embedding is held (and pickled) once.
+    The embedding of a chunk is the row of its id in the matrix.
+    """
+    for level in ['l1', 'l2']:
+        if f'{level}_emb_matrix' in index and isinstance(index[f'{level}_index'], dict):
+            for chunk in index[f'{level}_index'].values():
+                chunk.pop('emb', None)
+    return index
 
 def create_twolevel_index(name, data, l1_chunk_size=1500, l2_chunk_size=300, embedding_model=default_embedding_model):
     def get_l2_paras():
@@ -78,6 +103,7 @@ def create_twolevel_index(name, data, l1_chunk_size=1500, l2_chunk_size=300, emb
             pid += 1
     
     index = {'embedding_model':embedding_model, 'name':name, 'type':'2level', 'l1_index':l1_index, 'l2_index':l2_index}
+    index = add_emb_matrices(index)
     return index
 
 def create_twolevel_index_corpus(name, corpus, l1_chunk_size=1500, l2_chunk_size=300, embedding_model=default_embedding_model):
@@ -114,4 +140,5 @@ def create_twolevel_index_corpus(name, corpus, l1_chunk_size=1500, l2_chunk_size
         pid += 1
     
     index = {'embedding_model':embedding_model, 'name':name, 'type':'2level', 'l1_index':l1_index, 'l2_index':l2_index}
+    index = add_emb_matrices(index)
     return index
\ No newline at end of file
@@ -1,2 +1,27 @@
+import numpy as np
+
 def get_index_name(index):
-    return index['name']
\ No newline at end of file
+    return index['name']
+
+def build_emb_matrix(level_index):
+    """
+    Given a level of an index (l1_index or l2_index), the function stacks the embeddings of all the chunks into one contiguous float32 matrix.
+    The rows are the embeddings as computed (not normalized), so the scores are the same dot products as scoring the chunk dicts.
+    Args:
+        level_index: dict: The level of the index. Each key is a chunk id and the value is a dict with key 'emb'
+    Returns:
+        emb_matrix: np.array: shape (n*d); n - number of chunks, d - dimension of embeddings
+        row_ids: np.array: shape (n); row_ids[i] is the chunk id of the i-th row of emb_matrix
+    """
+    row_ids = np.array(sorted(level_index.keys()), dtype=np.int64)
+    emb_matrix = np.ascontiguousarray([level_index[key]['emb'] for key in row_ids], dtype=np.float32)
+    return emb_matrix, row_ids
+
+def get_emb_matrix(index, level):
+    """
+    Returns the embedding matrix and row ids of a level ('l1' or 'l2') of an index.
+    Indexes created before the matrices were stored inside the index get them built here once and cached on the index.
+    """
+    if f'{level}_emb_matrix' not in index:
+        index[f'{level}_emb_matrix'], index[f'{level}_row_ids'] = build_emb_matrix(index[f'{level}_index'])
+    return index[f'{level}_emb_matrix'], index[f'{level}_row_ids']
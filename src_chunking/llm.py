@@ -3,7 +3,7 @@ import json
 import time
 from openai import OpenAI
 import google.generativeai as genai
-from src.utils import load_pickle, write_pickle
+from src.utils import load_pickle, write_pickle, count_remote_call
 from src.config import chat_openai_cache_file, chat_gemini_cache_file, openai_key, gemini_key, logger
 
 client = OpenAI(api_key=openai_key)
@@ -35,6 +35,7 @@ def chat_completion_openai(prompt, model='gpt-4o', messages=None, response_forma
         logger.info('not using cache')
         while True:
             try:
+                count_remote_call('chat')
                 stream = client.chat.completions.create(
                     model=model,
                     messages=messages,
@@ -87,6 +88,7 @@ def chat_completion_gemini(prompt, messages=None, response_format=None, cache=Tr
     else:
         while True:
             try:
+                count_remote_call('chat')
                 res = model.generate_content(prompt if messages is None else messages)
                 if response_format == 'json':
                     dict_res = json.loads(res.text)
@@ -3,11 +3,34 @@ import json
 import fitz
 import spacy
 import pickle
+import threading
 import numpy as np
 from tqdm import tqdm
 from transformers import AutoTokenizer
 from src.config import sentencize_cache_file, logger, index_folder
 
+remote_calls = {'chat': 0, 'embeddings': 0}
+remote_calls_lock = threading.Lock()
+
+def count_remote_call(kind):
+    """
+    Increments the counter of remote calls of a given kind ('chat' or 'embeddings').
+    Only the calls that actually go to an API are counted (cache hits are not).
+    """
+    with remote_calls_lock:
+        remote_calls[kind] = remote_calls.get(kind, 0) + 1
+    return
+
+def reset_remote_calls():
+    with remote_calls_lock:
+        for kind in remote_calls:
+            remote_calls[kind] = 0
+    return
+
+def get_remote_calls():
+    with remote_calls_lock:
+        return dict(remote_calls)
+
 def print_list(lst, title, element_delim=None):
     """
     Prints a given list of items with a title
@@ -0,0 +1,116 @@
+import os
+import sys
+import types
+import hashlib
+import tempfile
+import importlib.util
+import numpy as np
+import pytest
+
+repo_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+package_folder = os.path.join(repo_folder, 'src_chunking')
+
+def load_src():
+    """
+    Makes src_chunking importable as src (the name the code imports itself by) and loads its config.
+    Without a src/config.py, the template config is loaded with placeholder API keys. The config creates its data folders (caches, logs) in the working directory, so the tests run in a temporary one.
+    The rule-based sentencizer is used so that no spaCy model is needed.
+    """
+    os.chdir(tempfile.mkdtemp(prefix='src_chunking_tests_'))
+    package = types.ModuleType('src')
+    package.__path__ = [package_folder]
+    sys.modules['src'] = package
+    config_path = os.path.join(package_folder, 'config.py')
+    if not os.path.exists(config_path):
+        config_path = os.path.join(package_folder, 'config - Copy.py')
+    spec = importlib.util.spec_from_file_location('src.config', config_path)
+    config = importlib.util.module_from_spec(spec)
+    sys.modules['src.config'] = config
+    package.config = config
+    spec.loader.exec_module(config)
+    for key in ['openai_key', 'gemini_key']:
+        if not hasattr(config, key):
+            setattr(config, key, 'test-key')
+    config.sentencizer_mode = 'rule'
+    return config
+
+load_src()
+
+def fake_embedding(text, dim=32):
+    """
+    Deterministic embedding of a text (seeded by its hash), not normalized.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+class FakeEmbedder:
+    """
+    Stands in for get_embeddings: deterministic embeddings and a log of the texts of every call.
+    """
+    def __init__(self, dim=32):
+        self.dim = dim
+        self.calls = []
+
+    def __call__(self, texts, params={}, model=None, batch_size=None):
+        self.calls.append(list(texts))
+        return np.array([fake_embedding(text, self.dim) for text in texts], dtype=np.float32).reshape(len(texts), self.dim)
+
+    def num_texts(self):
+        return sum([len(texts) for texts in self.calls])
+
+@pytest.fixture
+def fake_embedder(monkeypatch, tmp_path):
+    """
+    Replaces the embedding model (and the query enhancement LLM call) with deterministic offline stand-ins.
+    """
+    import src.embeddings
+    import src.index.search
+    embedder = FakeEmbedder()
+    monkeypatch.setattr(src.embeddings, 'get_embeddings', embedder)
+    monkeypatch.setattr(src.index.search, 'get_embeddings', embedder)
+    monkeypatch.setattr(src.index.search, 'query_enhancement', lambda query, history=None, history_len=10: f'{query} enhanced')
+    return embedder
+
+words = ['power', 'solar', 'grid', 'tariff', 'revenue', 'plant', 'coal', 'wind', 'capacity', 'debt', 'board', 'dividend', 'transmission', 'order', 'customer', 'storage']
+
+def make_chunk_text(rng, num_words=12):
+    return ' '.join(rng.choice(words, size=num_words).tolist()) + '.'
+
+def make_page(rng, num_paras=5):
+    return '\n'.join([' '.join([make_chunk_text(rng) for _ in range(4)]) for _ in range(num_paras)])
+
+@pytest.fixture
+def make_chunked_index(fake_embedder):
+    """
+    Returns a function that creates a two-level index with create_twolevel_index from pages of random sentences, chunked and embedded (by the fake embedder) as scraped data is.
+    """
+    from src.index.twolevel_index import create_twolevel_index
+    def make(num_pages=6, seed=0, name='Chunked', l1_chunk_size=300, l2_chunk_size=80):
+        rng = np.random.default_rng(seed)
+        data = {f'https://example.com/{seed}/{i}': make_page(rng) for i in range(num_pages)}
+        return create_twolevel_index(name, data, l1_chunk_size=l1_chunk_size, l2_chunk_size=l2_chunk_size)
+    return make
+
+@pytest.fixture
+def make_synthetic_index():
+    """
+    Returns a function that creates a two-level index of chunk dicts with random texts and embeddings (not normalized, as mean-pooled paragraph embeddings), with its embedding matrices unless prepare is False.
+    """
+    from src.index.twolevel_index import add_emb_matrices
+    def make(num_l1=40, max_children=6, dim=32, seed=0, name='Synthetic', embedding_model='text-embedding-004', prepare=True):
+        rng = np.random.default_rng(seed)
+        l1_index, l2_index = {}, {}
+        cid = 0
+        for pid in range(num_l1):
+            center = rng.standard_normal(dim)
+            num_children = int(rng.integers(1, max_children+1))
+            cids = list(range(cid, cid+num_children))
+            info = {'website': f'https://example.com/{pid % 7}'}
+            texts = [make_chunk_text(rng) for _ in cids]
+            l1_index[pid] = {'text': ' '.join(texts), 'emb': (center*rng.uniform(0.5, 1.0)).astype(np.float32), 'cids': cids, 'info': info}
+            for c, text in zip(cids, texts):
+                l2_index[c] = {'text': text, 'emb': (center + 0.8*rng.standard_normal(dim)).astype(np.float32)*rng.uniform(0.5, 1.0), 'pid': pid, 'info': dict(info)}
+            cid += num_children
+        index = {'embedding_model': embedding_model, 'name': name, 'type': '2level', 'l1_index': l1_index, 'l2_index': l2_index}
+        return add_emb_matrices(index) if prepare else index
+    return make
@@ -0,0 +1,30 @@
+import src.index.search
+from src.index.search import create_query_plan, search_on_index
+
+def test_one_enhancement_and_one_embedding_call_per_turn(make_synthetic_index, fake_embedder, monkeypatch):
+    enhancements = []
+    def query_enhancement(query, history=None, history_len=10):
+        enhancements.append(query)
+        return f'{query} enhanced'
+    monkeypatch.setattr(src.index.search, 'query_enhancement', query_enhancement)
+    index_1 = make_synthetic_index(seed=1, name='First')
+    index_2 = make_synthetic_index(seed=2, name='Second')
+    query_plan = create_query_plan('dividend policy', search_query='hybrid')
+    for index in [index_1, index_2]:
+        search_on_index('dividend policy', index, {'search_query': 'hybrid', 'k': 10}, verbose=False, query_plan=query_plan)
+    assert enhancements == ['dividend policy']
+    assert fake_embedder.calls == [['dividend policy', 'dividend policy enhanced']]
+
+def test_query_texts_of_each_search_query():
+    assert create_query_plan('grid', search_query='raw')['query_texts'] == {'raw': 'grid'}
+    assert create_query_plan('grid', search_query='lexical')['query_texts'] == {}
+    assert create_query_plan('grid', search_query='lexical')['enhanced_query'] is None
+
+def test_one_query_plan_serves_chunked_indexes(make_chunked_index, fake_embedder):
+    indexes = [make_chunked_index(seed=seed, name=f'Chunked {seed}') for seed in range(2)]
+    query_plan = create_query_plan('solar tariff', search_query='hybrid')
+    num_calls = len(fake_embedder.calls)
+    for index in indexes:
+        shared = search_on_index('solar tariff', index, {'search_query': 'hybrid', 'k': 10}, verbose=False, query_plan=query_plan)
+        assert shared == search_on_index('solar tariff', index, {'search_query': 'hybrid', 'k': 10}, verbose=False)
+    assert fake_embedder.calls[num_calls] == ['solar tariff', 'solar tariff enhanced']
@@ -0,0 +1,39 @@
+import pickle
+import numpy as np
+from src.index.twolevel_index import add_emb_matrices
+from src.index.utils import get_emb_matrix
+from src.index.search import search_on_dict_index
+
+def test_embedding_matrix_is_the_only_copy_of_the_embeddings(make_synthetic_index):
+    index = make_synthetic_index(prepare=False)
+    embs = {level: {key: chunk['emb'].copy() for key, chunk in index[f'{level}_index'].items()} for level in ['l1', 'l2']}
+    index = add_emb_matrices(index)
+    for level in ['l1', 'l2']:
+        assert all(['emb' not in chunk for chunk in index[f'{level}_index'].values()])
+        expected = np.array([embs[level][key] for key in index[f'{level}_row_ids'].tolist()], dtype=np.float32)
+        assert np.array_equal(index[f'{level}_emb_matrix'], expected) # rows are not normalized
+    loaded = pickle.loads(pickle.dumps(index))
+    assert all(['emb' not in chunk for chunk in loaded['l1_index'].values()])
+
+def test_scores_are_the_dot_products_of_the_stored_embeddings(make_synthetic_index, fake_embedder):
+    index = make_synthetic_index(prepare=False)
+    embs = {key: chunk['emb'].copy() for key, chunk in index['l1_index'].items()}
+    index = add_emb_matrices(index)
+    res = search_on_dict_index('solar tariff', index['l1_index'], index['embedding_model'], k=10, search_query='raw', emb_matrix=index['l1_emb_matrix'], row_ids=index['l1_row_ids'])
+    query_emb = fake_embedder(['solar tariff'])[0]
+    expected = sorted([float(emb @ query_emb) for emb in embs.values()], reverse=True)[:10]
+    assert np.allclose(res['top_k_similarity_scores'], expected, rtol=1e-5)
+
+def test_older_indexes_get_the_matrices_built_once(make_synthetic_index):
+    legacy = make_synthetic_index(prepare=False)
+    emb_matrix, row_ids = get_emb_matrix(legacy, 'l2')
+    assert get_emb_matrix(legacy, 'l2')[0] is emb_matrix
+    assert all([np.array_equal(emb_matrix[row], legacy['l2_index'][key]['emb']) for row, key in enumerate(row_ids.tolist())])
+
+def test_chunked_pages_are_scored_by_the_dot_products_of_their_rows(make_chunked_index, fake_embedder):
+    index = make_chunked_index()
+    assert all(['emb' not in chunk for level in ['l1', 'l2'] for chunk in index[f'{level}_index'].values()])
+    res = search_on_dict_index('solar tariff', index['l2_index'], index['embedding_model'], k=10, search_query='raw', emb_matrix=index['l2_emb_matrix'], row_ids=index['l2_row_ids'])
+    scores = index['l2_emb_matrix'] @ fake_embedder(['solar tariff'])[0]
+    assert np.allclose(res['top_k_similarity_scores'], np.sort(scores)[::-1][:10], rtol=1e-5)
+    assert res['top_k_indices'] == [int(index['l2_row_ids'][row]) for row in np.argsort(-scores)[:10]]